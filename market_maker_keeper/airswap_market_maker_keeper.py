@@ -305,10 +305,10 @@ class AirswapBands(Bands):
             config = reloadable_config.get_config(spread_feed.get()[0])
             control_feed_value = control_feed.get()[0]
 
-            buy_bands = list(map(BuyBand, config['buyBands']))
-            buy_limits = SideLimits(config['buyLimits'] if 'buyLimits' in config else [], history.buy_history)
-            sell_bands = list(map(SellBand, config['sellBands']))
-            sell_limits = SideLimits(config['sellLimits'] if 'sellLimits' in config else [], history.sell_history)
+            buy_bands = Bands.parse_bands(BuyBand, config['buyBands'])
+            buy_limits = SideLimits(config.get('buyLimits', []), history.buy_history)
+            sell_bands = Bands.parse_bands(SellBand, config['sellBands'])
+            sell_limits = SideLimits(config.get('sellLimits', []), history.sell_history)
 
             if len(buy_bands) != 1:
                 logging.getLogger().warning("You must only have one buy band. This is required for airswap compatability.")
@@ -339,7 +339,7 @@ class AirswapBands(Bands):
             buy_bands = []
             buy_limits = SideLimits([], history.buy_history)
             sell_bands = []
-            sell_limits = SideLimits([], history.buy_history)
+            sell_limits = SideLimits([], history.sell_history)
 
         return AirswapBands(buy_bands=buy_bands, buy_limits=buy_limits, sell_bands=sell_bands, sell_limits=sell_limits)
 
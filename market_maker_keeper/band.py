@@ -15,11 +15,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import itertools
+import heapq
+import json
 import logging
-import operator
-from functools import reduce
-from pprint import pformat
+from bisect import bisect_left
+from functools import lru_cache, partial
 from typing import Tuple, Optional
 
 import time
@@ -30,6 +30,9 @@ from market_maker_keeper.price_feed import Price
 from market_maker_keeper.reloadable_config import ReloadableConfig
 from pymaker.numeric import Wad
 
+# `Wad` is immutable, so a single zero can be shared instead of creating it over and over in loops.
+_WAD_ZERO = Wad(0)
+
 
 class Band:
     def __init__(self,
@@ -59,9 +62,9 @@ class Band:
         self.dust_cutoff = dust_cutoff
         self.params = params
 
-        assert(self.min_amount >= Wad(0))
-        assert(self.avg_amount >= Wad(0))
-        assert(self.max_amount >= Wad(0))
+        assert(self.min_amount >= _WAD_ZERO)
+        assert(self.avg_amount >= _WAD_ZERO)
+        assert(self.max_amount >= _WAD_ZERO)
         assert(self.min_amount <= self.avg_amount)
         assert(self.avg_amount <= self.max_amount)
 
@@ -75,6 +78,10 @@ class Band:
     def includes(self, order, target_price: Wad) -> bool:
         raise NotImplemented()
 
+    def price_range(self, target_price: Wad) -> Tuple[Wad, Wad]:
+        """Return the lowest (exclusive) and the highest (inclusive) order price which falls into the band."""
+        raise NotImplementedError()
+
     def type(self) -> str:
         raise NotImplemented()
 
@@ -83,30 +90,38 @@ class Band:
 
         # Get all orders which are currently present in the band.
         orders_in_band = [order for order in orders if self.includes(order, target_price)]
-        orders_total = Bands.total_amount(orders_in_band)
 
-        # The sorting in which we remove orders depends on which band we are in.
+        return self._excessive_orders(orders_in_band, Bands.total_amount(orders_in_band), target_price, is_first_band, is_last_band)
+
+    def _excessive_orders(self, orders_in_band: list, orders_total: Wad, target_price: Wad, is_first_band: bool, is_last_band: bool):
+        """Same as `excessive_orders()`, for orders already known to be in the band and their total amount."""
+
+        # The order in which we remove orders depends on which band we are in.
         # * In the first band we start cancelling with orders closest to the target price.
         # * In the last band we start cancelling with orders furthest from the target price.
         # * In remaining cases we remove orders starting from the smallest one.
+        # Orders with equal keys get removed starting from the one which comes last in `orders`.
         if is_first_band:
-            sorting = lambda order: abs(self.order_price(order) - target_price)
-            reverse = True
+            sorting = lambda order: abs(self.order_price(order).value - target_price.value)
 
         elif is_last_band:
-            sorting = lambda order: abs(self.order_price(order) - target_price)
-            reverse = False
+            sorting = lambda order: -abs(self.order_price(order).value - target_price.value)
 
         else:
-            sorting = lambda order: order.remaining_sell_amount
-            reverse = True
+            sorting = lambda order: order.remaining_sell_amount.value
 
         # Keep removing orders until their total amount stops being greater than `maxAmount`.
-        orders_to_leave = sorted(orders_in_band, key=sorting, reverse=reverse)
-        while Bands.total_amount(orders_to_leave) > self.max_amount:
-            orders_to_leave.pop()
-
-        result = set(orders_in_band) - set(orders_to_leave)
+        # Usually only a few orders get removed, so we pop them from a heap instead of sorting
+        # all of them, and keep a running total of raw values instead of summing them up again.
+        heap = [(sorting(order), -index, order) for index, order in enumerate(orders_in_band)]
+        heapq.heapify(heap)
+        orders_to_leave_total = orders_total.value
+        max_amount = self.max_amount.value
+        result = []
+        while orders_to_leave_total > max_amount:
+            _, _, order = heapq.heappop(heap)
+            orders_to_leave_total -= order.remaining_sell_amount.value
+            result.append(order)
 
         if len(result) > 0:
             logger = logging.getLogger()
@@ -128,20 +143,33 @@ class BuyBand(Band):
                          dust_cutoff=Wad.from_number(dictionary['dustCutoff']),
                          params=dictionary.get('params', {}))
 
+        # `Wad.from_number()` is expensive, so we only want to do it once per band.
+        self._min_factor = Wad.from_number(1 - self.min_margin)
+        self._avg_factor = Wad.from_number(1 - self.avg_margin)
+        self._max_factor = Wad.from_number(1 - self.max_margin)
+
     def order_price(self, order) -> Wad:
         return order.sell_to_buy_price
 
     def includes(self, order, target_price: Wad) -> bool:
         price = self.order_price(order)
-        price_min = self._apply_margin(target_price, self.min_margin)
-        price_max = self._apply_margin(target_price, self.max_margin)
-        return (price > price_max) and (price <= price_min)
+
+        # Bands are usually listed starting from the one closest to the target price, so orders which
+        # do not belong to a band are most often further away from the target price than the band is.
+        # We check that bound first, so in these cases we do not need to calculate the other one.
+        if price <= target_price * self._max_factor:
+            return False
+
+        return price <= target_price * self._min_factor
+
+    def price_range(self, target_price: Wad) -> Tuple[Wad, Wad]:
+        return target_price * self._max_factor, target_price * self._min_factor
 
     def type(self) -> str:
         return "buy"
 
     def avg_price(self, target_price: Wad) -> Wad:
-        return self._apply_margin(target_price, self.avg_margin)
+        return target_price * self._avg_factor
 
     @staticmethod
     def _apply_margin(price: Wad, margin: float) -> Wad:
@@ -159,20 +187,31 @@ class SellBand(Band):
                          dust_cutoff=Wad.from_number(dictionary['dustCutoff']),
                          params=dictionary.get('params', {}))
 
+        # See `BuyBand.__init__()` for why these are precalculated.
+        self._min_factor = Wad.from_number(1 + self.min_margin)
+        self._avg_factor = Wad.from_number(1 + self.avg_margin)
+        self._max_factor = Wad.from_number(1 + self.max_margin)
+
     def order_price(self, order) -> Wad:
         return order.buy_to_sell_price
 
     def includes(self, order, target_price: Wad) -> bool:
         price = self.order_price(order)
-        price_min = self._apply_margin(target_price, self.min_margin)
-        price_max = self._apply_margin(target_price, self.max_margin)
-        return (price > price_min) and (price <= price_max)
+
+        # See `BuyBand.includes()` for why we check the bound further away from the target price first.
+        if price > target_price * self._max_factor:
+            return False
+
+        return price > target_price * self._min_factor
+
+    def price_range(self, target_price: Wad) -> Tuple[Wad, Wad]:
+        return target_price * self._min_factor, target_price * self._max_factor
 
     def type(self) -> str:
         return "sell"
 
     def avg_price(self, target_price: Wad) -> Wad:
-        return self._apply_margin(target_price, self.avg_margin)
+        return target_price * self._avg_factor
 
     @staticmethod
     def _apply_margin(price: Wad, margin: float) -> Wad:
@@ -180,15 +219,8 @@ class SellBand(Band):
 
 
 class NewOrder:
+    """Represents an order which needs to be placed to bring the total amount in a band above its minimum."""
     def __init__(self, is_sell: bool, price: Wad, amount: Wad, pay_amount: Wad, buy_amount: Wad, band: Band, confirm_function):
-        assert(isinstance(is_sell, bool))
-        assert(isinstance(price, Wad))
-        assert(isinstance(amount, Wad))
-        assert(isinstance(pay_amount, Wad))
-        assert(isinstance(buy_amount, Wad))
-        assert(isinstance(band, Band))
-        assert(callable(confirm_function))
-
         self.is_sell = is_sell
         self.price = price
         self.amount = amount
@@ -201,7 +233,8 @@ class NewOrder:
         self._confirm_function()
 
     def __repr__(self):
-        return pformat(vars(self))
+        return f"NewOrder(is_sell={self.is_sell}, price={self.price}, amount={self.amount}," \
+               f" pay_amount={self.pay_amount}, buy_amount={self.buy_amount})"
 
 
 class Bands:
@@ -218,10 +251,10 @@ class Bands:
             config = reloadable_config.get_config(spread_feed.get()[0])
             control_feed_value = control_feed.get()[0]
 
-            buy_bands = list(map(BuyBand, config['buyBands']))
-            buy_limits = SideLimits(config['buyLimits'] if 'buyLimits' in config else [], history.buy_history)
-            sell_bands = list(map(SellBand, config['sellBands']))
-            sell_limits = SideLimits(config['sellLimits'] if 'sellLimits' in config else [], history.sell_history)
+            buy_bands = Bands.parse_bands(BuyBand, config['buyBands'])
+            buy_limits = SideLimits(config.get('buyLimits', []), history.buy_history)
+            sell_bands = Bands.parse_bands(SellBand, config['sellBands'])
+            sell_limits = SideLimits(config.get('sellLimits', []), history.sell_history)
 
             if 'canBuy' not in control_feed_value or 'canSell' not in control_feed_value:
                 logging.getLogger().warning("Control feed expired. Assuming no buy bands and no sell bands.")
@@ -244,10 +277,26 @@ class Bands:
             buy_bands = []
             buy_limits = SideLimits([], history.buy_history)
             sell_bands = []
-            sell_limits = SideLimits([], history.buy_history)
+            sell_limits = SideLimits([], history.sell_history)
 
         return Bands(buy_bands=buy_bands, buy_limits=buy_limits, sell_bands=sell_bands, sell_limits=sell_limits)
 
+    @staticmethod
+    def parse_bands(band_class, bands_config: list) -> list:
+        """Create `band_class` instances from a list of band dictionaries from the config file.
+
+        The config is usually read on every keeper cycle but it rarely changes, so bands
+        are only created again if the content of `bands_config` has changed.
+        """
+        assert(isinstance(bands_config, list))
+
+        return list(Bands._parse_bands_json(band_class, json.dumps(bands_config, sort_keys=True)))
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _parse_bands_json(band_class, bands_json: str) -> tuple:
+        return tuple(map(band_class, json.loads(bands_json)))
+
     def __init__(self, buy_bands: list, buy_limits: SideLimits, sell_bands: list, sell_limits: SideLimits):
         assert(isinstance(buy_bands, list))
         assert(isinstance(buy_limits, SideLimits))
@@ -265,39 +314,23 @@ class Bands:
             self.buy_bands = []
             self.sell_bands = []
 
-    def _excessive_sell_orders(self, our_sell_orders: list, target_price: Wad):
-        """Return sell orders which need to be cancelled to bring total amounts within all sell bands below maximums."""
-        assert(isinstance(our_sell_orders, list))
-        assert(isinstance(target_price, Wad))
-
-        bands = self.sell_bands
-
-        for band in bands:
-            for order in band.excessive_orders(our_sell_orders, target_price, band == bands[0], band == bands[-1]):
-                yield order
-
-    def _excessive_buy_orders(self, our_buy_orders: list, target_price: Wad):
-        """Return buy orders which need to be cancelled to bring total amounts within all buy bands below maximums."""
-        assert(isinstance(our_buy_orders, list))
-        assert(isinstance(target_price, Wad))
-
-        bands = self.buy_bands
-
-        for band in bands:
-            for order in band.excessive_orders(our_buy_orders, target_price, band == bands[0], band == bands[-1]):
-                yield order
+    def _cancellable_side_orders(self, orders: list, bands: list, target_price: Wad) -> list:
+        """Return buy or sell orders which need to be cancelled, either to bring total amounts within all
+        bands below maximums or as they do not fall into any band."""
+        orders_by_band, orders_outside_bands = self._orders_by_band(orders, bands, target_price)
+        result = []
 
-    def _outside_any_band_orders(self, orders: list, bands: list, target_price: Wad):
-        """Return buy or sell orders which need to be cancelled as they do not fall into any buy or sell band."""
-        assert(isinstance(orders, list))
-        assert(isinstance(bands, list))
-        assert(isinstance(target_price, Wad))
+        for band, orders_in_band in zip(bands, orders_by_band):
+            # In the steady state bands do not exceed their maximums, so we skip them straight away.
+            total_amount = self.total_amount(orders_in_band)
+            if total_amount > band.max_amount:
+                result.extend(band._excessive_orders(orders_in_band, total_amount, target_price, band == bands[0], band == bands[-1]))
 
-        for order in orders:
-            if not any(band.includes(order, target_price) for band in bands):
-                self.logger.info(f"Order #{order.order_id} doesn't belong to any band, scheduling it for cancellation")
+        for order in orders_outside_bands:
+            self.logger.info(f"Order #{order.order_id} doesn't belong to any band, scheduling it for cancellation")
+            result.append(order)
 
-                yield order
+        return result
 
     def cancellable_orders(self, our_buy_orders: list, our_sell_orders: list, target_price: Price) -> list:
         assert(isinstance(our_buy_orders, list))
@@ -309,16 +342,14 @@ class Bands:
             buy_orders_to_cancel = our_buy_orders
 
         else:
-            buy_orders_to_cancel = list(itertools.chain(self._excessive_buy_orders(our_buy_orders, target_price.buy_price),
-                                                        self._outside_any_band_orders(our_buy_orders, self.buy_bands, target_price.buy_price)))
+            buy_orders_to_cancel = self._cancellable_side_orders(our_buy_orders, self.buy_bands, target_price.buy_price)
 
         if target_price.sell_price is None:
             self.logger.warning("Cancelling all sell orders as no sell price is available.")
             sell_orders_to_cancel = our_sell_orders
 
         else:
-            sell_orders_to_cancel = list(itertools.chain(self._excessive_sell_orders(our_sell_orders, target_price.sell_price),
-                                                         self._outside_any_band_orders(our_sell_orders, self.sell_bands, target_price.sell_price)))
+            sell_orders_to_cancel = self._cancellable_side_orders(our_sell_orders, self.sell_bands, target_price.sell_price)
 
         return buy_orders_to_cancel + sell_orders_to_cancel
 
@@ -330,102 +361,150 @@ class Bands:
         assert(isinstance(target_price, Price))
 
         if target_price is not None:
-            new_buy_orders, missing_buy_amount = self._new_buy_orders(our_buy_orders, our_buy_balance, target_price.buy_price) \
+            # Both sides use the same timestamp, so the limits are evaluated consistently.
+            timestamp = time.time()
+
+            new_buy_orders, missing_buy_amount = self._new_buy_orders(our_buy_orders, our_buy_balance, target_price.buy_price, timestamp) \
                 if target_price.buy_price is not None \
-                else ([], Wad(0))
+                else ([], _WAD_ZERO)
 
-            new_sell_orders, missing_sell_amount = self._new_sell_orders(our_sell_orders, our_sell_balance, target_price.sell_price) \
+            new_sell_orders, missing_sell_amount = self._new_sell_orders(our_sell_orders, our_sell_balance, target_price.sell_price, timestamp) \
                 if target_price.sell_price is not None \
-                else ([], Wad(0))
+                else ([], _WAD_ZERO)
 
             return new_buy_orders + new_sell_orders, missing_buy_amount, missing_sell_amount
 
         else:
-            return [], Wad(0), Wad(0)
+            return [], _WAD_ZERO, _WAD_ZERO
 
-    def _new_sell_orders(self, our_sell_orders: list, our_sell_balance: Wad, target_price: Wad):
+    def _new_sell_orders(self, our_sell_orders: list, our_sell_balance: Wad, target_price: Wad, timestamp: float):
         """Return sell orders which need to be placed to bring total amounts within all sell bands above minimums."""
-        assert(isinstance(our_sell_orders, list))
-        assert(isinstance(our_sell_balance, Wad))
-        assert(isinstance(target_price, Wad))
-
         new_orders = []
-        limit_amount = self.sell_limits.available_limit(time.time())
-        missing_amount = Wad(0)
+        limit_amount = self.sell_limits.available_limit(timestamp)
+        missing_amount = _WAD_ZERO
 
-        for band in self.sell_bands:
-            orders = [order for order in our_sell_orders if band.includes(order, target_price)]
+        orders_by_band, _ = self._orders_by_band(our_sell_orders, self.sell_bands, target_price)
+
+        for band, orders in zip(self.sell_bands, orders_by_band):
             total_amount = self.total_amount(orders)
-            if total_amount < band.min_amount:
-                price = band.avg_price(target_price)
-                pay_amount = Wad.min(band.avg_amount - total_amount, our_sell_balance, limit_amount)
-                buy_amount = pay_amount * price
-                missing_amount += Wad.max((band.avg_amount - total_amount) - our_sell_balance, Wad(0))
-                if (price > Wad(0)) and (pay_amount >= band.dust_cutoff) and (pay_amount > Wad(0)) and (buy_amount > Wad(0)):
-                    self.logger.info(f"Sell band (spread <{band.min_margin}, {band.max_margin}>,"
-                                     f" amount <{band.min_amount}, {band.max_amount}>) has amount {total_amount},"
-                                     f" creating new sell order with price {price}")
-
-                    our_sell_balance = our_sell_balance - pay_amount
-                    limit_amount = limit_amount - pay_amount
-
-                    new_orders.append(NewOrder(is_sell=True,
-                                               price=price,
-                                               amount=pay_amount,
-                                               pay_amount=pay_amount,
-                                               buy_amount=buy_amount,
-                                               band=band,
-                                               confirm_function=lambda: self.sell_limits.use_limit(time.time(), pay_amount)))
+            if total_amount >= band.min_amount:
+                continue
+
+            deficit = band.avg_amount - total_amount
+            pay_amount = Wad.min(deficit, our_sell_balance, limit_amount)
+            missing_amount += Wad.max(deficit - our_sell_balance, _WAD_ZERO)
+
+            # If we are out of balance or have used up our limits there is nothing to place,
+            # but we still go through all bands to find out how much we are missing.
+            if pay_amount <= _WAD_ZERO:
+                continue
+
+            price = band.avg_price(target_price)
+            buy_amount = pay_amount * price
+            if (price > _WAD_ZERO) and (pay_amount >= band.dust_cutoff) and (buy_amount > _WAD_ZERO):
+                self.logger.info(f"Sell band (spread <{band.min_margin}, {band.max_margin}>,"
+                                 f" amount <{band.min_amount}, {band.max_amount}>) has amount {total_amount},"
+                                 f" creating new sell order with price {price}")
+
+                our_sell_balance = our_sell_balance - pay_amount
+                limit_amount = limit_amount - pay_amount
+
+                new_orders.append(NewOrder(is_sell=True,
+                                           price=price,
+                                           amount=pay_amount,
+                                           pay_amount=pay_amount,
+                                           buy_amount=buy_amount,
+                                           band=band,
+                                           confirm_function=partial(self.sell_limits.use_limit_now, pay_amount)))
 
         return new_orders, missing_amount
 
-    def _new_buy_orders(self, our_buy_orders: list, our_buy_balance: Wad, target_price: Wad):
+    def _new_buy_orders(self, our_buy_orders: list, our_buy_balance: Wad, target_price: Wad, timestamp: float):
         """Return buy orders which need to be placed to bring total amounts within all buy bands above minimums."""
-        assert(isinstance(our_buy_orders, list))
-        assert(isinstance(our_buy_balance, Wad))
-        assert(isinstance(target_price, Wad))
-
         new_orders = []
-        limit_amount = self.buy_limits.available_limit(time.time())
-        missing_amount = Wad(0)
+        limit_amount = self.buy_limits.available_limit(timestamp)
+        missing_amount = _WAD_ZERO
+
+        orders_by_band, _ = self._orders_by_band(our_buy_orders, self.buy_bands, target_price)
 
-        for band in self.buy_bands:
-            orders = [order for order in our_buy_orders if band.includes(order, target_price)]
+        for band, orders in zip(self.buy_bands, orders_by_band):
             total_amount = self.total_amount(orders)
-            if total_amount < band.min_amount:
-                price = band.avg_price(target_price)
-                pay_amount = Wad.min(band.avg_amount - total_amount, our_buy_balance, limit_amount)
-                buy_amount = pay_amount / price
-                missing_amount += Wad.max((band.avg_amount - total_amount) - our_buy_balance, Wad(0))
-                if (price > Wad(0)) and (pay_amount >= band.dust_cutoff) and (pay_amount > Wad(0)) and (buy_amount > Wad(0)):
-                    self.logger.info(f"Buy band (spread <{band.min_margin}, {band.max_margin}>,"
-                                     f" amount <{band.min_amount}, {band.max_amount}>) has amount {total_amount},"
-                                     f" creating new buy order with price {price}")
-
-                    our_buy_balance = our_buy_balance - pay_amount
-                    limit_amount = limit_amount - pay_amount
-
-                    new_orders.append(NewOrder(is_sell=False,
-                                               price=price,
-                                               amount=buy_amount,
-                                               pay_amount=pay_amount,
-                                               buy_amount=buy_amount,
-                                               band=band,
-                                               confirm_function=lambda: self.buy_limits.use_limit(time.time(), pay_amount)))
+            if total_amount >= band.min_amount:
+                continue
+
+            deficit = band.avg_amount - total_amount
+            pay_amount = Wad.min(deficit, our_buy_balance, limit_amount)
+            missing_amount += Wad.max(deficit - our_buy_balance, _WAD_ZERO)
+
+            # If we are out of balance or have used up our limits there is nothing to place,
+            # but we still go through all bands to find out how much we are missing.
+            if pay_amount <= _WAD_ZERO:
+                continue
+
+            price = band.avg_price(target_price)
+            buy_amount = pay_amount / price
+            if (price > _WAD_ZERO) and (pay_amount >= band.dust_cutoff) and (buy_amount > _WAD_ZERO):
+                self.logger.info(f"Buy band (spread <{band.min_margin}, {band.max_margin}>,"
+                                 f" amount <{band.min_amount}, {band.max_amount}>) has amount {total_amount},"
+                                 f" creating new buy order with price {price}")
+
+                our_buy_balance = our_buy_balance - pay_amount
+                limit_amount = limit_amount - pay_amount
+
+                new_orders.append(NewOrder(is_sell=False,
+                                           price=price,
+                                           amount=buy_amount,
+                                           pay_amount=pay_amount,
+                                           buy_amount=buy_amount,
+                                           band=band,
+                                           confirm_function=partial(self.buy_limits.use_limit_now, pay_amount)))
 
         return new_orders, missing_amount
 
+    @staticmethod
+    def _orders_by_band(orders: list, bands: list, target_price: Wad) -> Tuple[list, list]:
+        """Group orders by the band they fall into.
+
+        Returns one list of orders for each band in `bands`, followed by a list of orders
+        which do not fall into any band. As bands do not overlap, each order can only fall
+        into one band.
+        """
+        orders_by_band = [[] for _ in bands]
+        orders_outside_bands = []
+
+        if len(bands) == 0:
+            return orders_by_band, list(orders)
+
+        # Price ranges of bands do not overlap, so once they are sorted we can find the only
+        # band an order can fall into with a binary search and compare raw values only.
+        price_ranges = sorted((high.value, low.value, index)
+                              for index, (low, high) in enumerate(band.price_range(target_price) for band in bands))
+        highs = [high for high, _, _ in price_ranges]
+
+        for order in orders:
+            price = bands[0].order_price(order).value
+            position = bisect_left(highs, price)
+
+            if position < len(price_ranges) and price_ranges[position][1] < price:
+                orders_by_band[price_ranges[position][2]].append(order)
+            else:
+                orders_outside_bands.append(order)
+
+        return orders_by_band, orders_outside_bands
+
     @staticmethod
     def total_amount(orders):
-        return reduce(operator.add, map(lambda order: order.remaining_sell_amount, orders), Wad(0))
+        # Summing raw values and wrapping the result once is much faster than adding up `Wad`s one by one.
+        return Wad(sum(order.remaining_sell_amount.value for order in orders))
 
     @staticmethod
     def _bands_overlap(bands: list):
-        def two_bands_overlap(band1, band2):
-            return band1.min_margin < band2.max_margin and band2.min_margin < band1.max_margin
+        # Once bands are sorted by `min_margin`, if any two of them overlap then
+        # at least one pair of adjacent bands overlaps as well.
+        sorted_bands = sorted(bands, key=lambda band: band.min_margin)
 
-        for band1 in bands:
-            if len(list(filter(lambda band2: two_bands_overlap(band1, band2), bands))) > 1:
+        for band1, band2 in zip(sorted_bands, sorted_bands[1:]):
+            if band2.min_margin < band1.max_margin:
                 return True
 
         return False
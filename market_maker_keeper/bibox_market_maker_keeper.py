@@ -92,6 +92,14 @@ class BiboxMarketMakerKeeper:
         self.arguments = parser.parse_args(args)
         setup_logging(self.arguments)
 
+        # The pair never changes, so we parse it only once instead of on every call.
+        self._pair = self.arguments.pair.upper()
+        self._token_sell = self._pair.split('_')[0]
+        self._token_buy = self._pair.split('_')[1]
+
+        self._our_balances = None
+        self._our_available_balances = None
+
         self.history = History()
         self.bibox_api = BiboxApi(api_server=self.arguments.bibox_api_server,
                                   api_key=self.arguments.bibox_api_key,
@@ -104,9 +112,11 @@ class BiboxMarketMakerKeeper:
         self.control_feed = create_control_feed(self.arguments)
         self.order_history_reporter = create_order_history_reporter(self.arguments)
 
-        self.order_book_manager = OrderBookManager(refresh_frequency=self.arguments.refresh_frequency)
+        self.order_book_manager = OrderBookManager(refresh_frequency=self.arguments.refresh_frequency,
+                                                   concurrent_balances=True)
         self.order_book_manager.get_orders_with(lambda: self.bibox_api.get_orders(pair=self.pair(), retry=True))
         self.order_book_manager.get_balances_with(lambda: self.bibox_api.coin_list(retry=True))
+        self.order_book_manager.place_orders_with(self.place_order_function)
         self.order_book_manager.cancel_orders_with(lambda order: self.bibox_api.cancel_order(order.order_id))
         self.order_book_manager.enable_history_reporting(self.order_history_reporter, self.our_buy_orders, self.our_sell_orders)
         self.order_book_manager.start()
@@ -121,16 +131,26 @@ class BiboxMarketMakerKeeper:
         self.order_book_manager.cancel_all_orders(final_wait_time=30)
 
     def pair(self):
-        return self.arguments.pair.upper()
+        return self._pair
 
     def token_sell(self) -> str:
-        return self.arguments.pair.split('_')[0].upper()
+        return self._token_sell
 
     def token_buy(self) -> str:
-        return self.arguments.pair.split('_')[1].upper()
+        return self._token_buy
 
-    def our_available_balance(self, our_balances: list, token: str) -> Wad:
-        return Wad.from_number(next(filter(lambda coin: coin['symbol'] == token, our_balances))['balance'])
+    def our_available_balances(self, our_balances: list) -> dict:
+        # The order book manager returns the same balances list until its next refresh, which
+        # happens less often than we synchronize orders, so we only convert each list once.
+        if our_balances is not self._our_balances:
+            # The coin list contains every coin listed on Bibox, so we go through it only once
+            # and convert only the balances of the two tokens we trade.
+            tokens = (self.token_sell(), self.token_buy())
+            self._our_available_balances = {coin['symbol']: Wad.from_number(coin['balance'])
+                                            for coin in our_balances if coin['symbol'] in tokens}
+            self._our_balances = our_balances
+
+        return self._our_available_balances
 
     def our_sell_orders(self, our_orders: list) -> list:
         return list(filter(lambda order: order.is_sell, our_orders))
@@ -143,9 +163,12 @@ class BiboxMarketMakerKeeper:
         order_book = self.order_book_manager.get_order_book()
         target_price = self.price_feed.get_price()
 
+        our_buy_orders = self.our_buy_orders(order_book.orders)
+        our_sell_orders = self.our_sell_orders(order_book.orders)
+
         # Cancel orders
-        cancellable_orders = bands.cancellable_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
-                                                      our_sell_orders=self.our_sell_orders(order_book.orders),
+        cancellable_orders = bands.cancellable_orders(our_buy_orders=our_buy_orders,
+                                                      our_sell_orders=our_sell_orders,
                                                       target_price=target_price)
         if len(cancellable_orders) > 0:
             self.order_book_manager.cancel_orders(cancellable_orders)
@@ -157,29 +180,26 @@ class BiboxMarketMakerKeeper:
             return
 
         # Place new orders
-        self.place_orders(bands.new_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
-                                           our_sell_orders=self.our_sell_orders(order_book.orders),
-                                           our_buy_balance=self.our_available_balance(order_book.balances, self.token_buy()),
-                                           our_sell_balance=self.our_available_balance(order_book.balances, self.token_sell()),
-                                           target_price=target_price)[0])
-
-    def place_orders(self, new_orders):
-        def place_order_function(new_order_to_be_placed):
-            amount = new_order_to_be_placed.pay_amount if new_order_to_be_placed.is_sell else new_order_to_be_placed.buy_amount
-            amount_symbol = self.token_sell()
-            money = new_order_to_be_placed.buy_amount if new_order_to_be_placed.is_sell else new_order_to_be_placed.pay_amount
-            money_symbol = self.token_buy()
-
-            new_order_id = self.bibox_api.place_order(is_sell=new_order_to_be_placed.is_sell,
-                                                      amount=amount,
-                                                      amount_symbol=amount_symbol,
-                                                      money=money,
-                                                      money_symbol=money_symbol)
-
-            return Order(new_order_id, 0, new_order_to_be_placed.is_sell, Wad(0), amount, amount_symbol, money, money_symbol)
-
-        for new_order in new_orders:
-            self.order_book_manager.place_order(lambda new_order=new_order: place_order_function(new_order))
+        our_balances = self.our_available_balances(order_book.balances)
+        self.order_book_manager.place_orders(bands.new_orders(our_buy_orders=our_buy_orders,
+                                                              our_sell_orders=our_sell_orders,
+                                                              our_buy_balance=our_balances[self.token_buy()],
+                                                              our_sell_balance=our_balances[self.token_sell()],
+                                                              target_price=target_price)[0])
+
+    def place_order_function(self, new_order):
+        amount = new_order.pay_amount if new_order.is_sell else new_order.buy_amount
+        amount_symbol = self.token_sell()
+        money = new_order.buy_amount if new_order.is_sell else new_order.pay_amount
+        money_symbol = self.token_buy()
+
+        new_order_id = self.bibox_api.place_order(is_sell=new_order.is_sell,
+                                                  amount=amount,
+                                                  amount_symbol=amount_symbol,
+                                                  money=money,
+                                                  money_symbol=money_symbol)
+
+        return Order(new_order_id, 0, new_order.is_sell, Wad(0), amount, amount_symbol, money, money_symbol)
 
 
 if __name__ == '__main__':
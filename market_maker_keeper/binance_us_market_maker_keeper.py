@@ -19,9 +19,9 @@ import argparse
 import logging
 import sys
 from datetime import datetime
+from functools import partial
 from typing import List
 
-import time
 from math import log10
 
 from market_maker_keeper.band import Band, Bands, NewOrder
@@ -59,18 +59,15 @@ class BinanceBands(Bands):
         self.rules = rules
 
 
-    def _new_sell_orders(self, our_sell_orders: list, our_sell_balance: Wad, target_price: Wad):
+    def _new_sell_orders(self, our_sell_orders: list, our_sell_balance: Wad, target_price: Wad, timestamp: float):
         """Return sell orders which need to be placed to bring total amounts within all sell bands above minimums."""
-        assert(isinstance(our_sell_orders, list))
-        assert(isinstance(our_sell_balance, Wad))
-        assert(isinstance(target_price, Wad))
-
         new_orders = []
-        limit_amount = self.sell_limits.available_limit(time.time())
+        limit_amount = self.sell_limits.available_limit(timestamp)
         missing_amount = Wad(0)
 
-        for band in self.sell_bands:
-            orders = [order for order in our_sell_orders if band.includes(order, target_price)]
+        orders_by_band, _ = self._orders_by_band(our_sell_orders, self.sell_bands, target_price)
+
+        for band, orders in zip(self.sell_bands, orders_by_band):
             total_amount = self.total_amount(orders)
             if total_amount < band.min_amount:
                 price = self._calculate_price(band, target_price)
@@ -91,22 +88,19 @@ class BinanceBands(Bands):
                                                pay_amount=pay_amount,
                                                buy_amount=buy_amount,
                                                band=band,
-                                               confirm_function=lambda: self.sell_limits.use_limit(time.time(), pay_amount)))
+                                               confirm_function=partial(self.sell_limits.use_limit_now, pay_amount)))
 
         return new_orders, missing_amount
 
-    def _new_buy_orders(self, our_buy_orders: list, our_buy_balance: Wad, target_price: Wad):
+    def _new_buy_orders(self, our_buy_orders: list, our_buy_balance: Wad, target_price: Wad, timestamp: float):
         """Return buy orders which need to be placed to bring total amounts within all buy bands above minimums."""
-        assert(isinstance(our_buy_orders, list))
-        assert(isinstance(our_buy_balance, Wad))
-        assert(isinstance(target_price, Wad))
-
         new_orders = []
-        limit_amount = self.buy_limits.available_limit(time.time())
+        limit_amount = self.buy_limits.available_limit(timestamp)
         missing_amount = Wad(0)
 
-        for band in self.buy_bands:
-            orders = [order for order in our_buy_orders if band.includes(order, target_price)]
+        orders_by_band, _ = self._orders_by_band(our_buy_orders, self.buy_bands, target_price)
+
+        for band, orders in zip(self.buy_bands, orders_by_band):
             total_amount = self.total_amount(orders)
             if total_amount < band.min_amount:
                 price = self._calculate_price(band, target_price)
@@ -127,7 +121,7 @@ class BinanceBands(Bands):
                                                pay_amount=pay_amount,
                                                buy_amount=buy_amount,
                                                band=band,
-                                               confirm_function=lambda: self.buy_limits.use_limit(time.time(), pay_amount)))
+                                               confirm_function=partial(self.buy_limits.use_limit_now, pay_amount)))
 
         return new_orders, missing_amount
 
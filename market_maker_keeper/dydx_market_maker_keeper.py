@@ -17,12 +17,9 @@
 
 import argparse
 import logging
-import operator
 import sys
 import time
 
-from functools import reduce
-
 from pyexchange.dydx import DydxApi, Order
 from pymaker.numeric import Wad
 
@@ -31,7 +28,7 @@ from market_maker_keeper.band import Bands
 from market_maker_keeper.order_book import OrderBookManager
 
 def total_amount(orders: list) -> Wad:
-    return reduce(operator.add, map(lambda order: order.remaining_sell_amount, orders), Wad(0))
+    return Bands.total_amount(orders)
 
 
 class DyDxMarketMakerKeeper(CEXKeeperAPI):
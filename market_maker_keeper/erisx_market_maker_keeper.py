@@ -187,6 +187,7 @@ class ErisXOrderBookManager(OrderBookManager):
                         self.logger.info("Order book became available")
 
                     self._state = {'orders': orders, 'balances': balances}
+                    self._state_available.set()
                     self._refresh_count += 1
 
                 self._report_order_book_updated()
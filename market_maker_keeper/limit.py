@@ -17,7 +17,7 @@
 
 import logging
 import threading
-from functools import reduce
+import time
 
 from pymaker.numeric import Wad
 
@@ -63,6 +63,9 @@ class SideLimits:
     def use_limit(self, timestamp: int, amount: Wad):
         self.side_history.add_item({'timestamp': timestamp, 'amount': amount})
 
+    def use_limit_now(self, amount: Wad):
+        self.use_limit(time.time(), amount)
+
 
 class SideLimit:
     def __init__(self, limit: dict):
@@ -78,7 +81,8 @@ class SideLimit:
     def available_limit(self, timestamp: int, side_history: SideHistory):
         assert(isinstance(side_history, SideHistory))
 
-        items = filter(lambda item: timestamp - self.seconds < item['timestamp'] <= timestamp, side_history.get_items())
-        used_amount = reduce(Wad.__add__, map(lambda item: item['amount'], items), Wad(0))
+        # Filter and sum raw values in one pass.
+        used_amount = Wad(sum(item['amount'].value for item in side_history.get_items()
+                              if timestamp - self.seconds < item['timestamp'] <= timestamp))
 
         return Wad.max(self.amount - used_amount, Wad(0))
@@ -87,15 +87,20 @@ class OrderBookManager:
     Attributes:
         refresh_frequency: Frequency (in seconds) of how often background order book (and balances)
             refresh takes place.
+        concurrent_balances: If `True`, balances are fetched at the same time as orders during each
+            refresh instead of after them. Only use it for exchanges which accept concurrent calls
+            to their private endpoints (i.e. do not reject requests with out-of-order nonces).
     """
 
     logger = logging.getLogger()
 
-    def __init__(self, refresh_frequency: int, max_workers: int = 5):
+    def __init__(self, refresh_frequency: int, max_workers: int = 5, concurrent_balances: bool = False):
         assert(isinstance(refresh_frequency, int))
         assert(isinstance(max_workers, int))
+        assert(isinstance(concurrent_balances, bool))
 
         self.refresh_frequency = refresh_frequency
+        self.concurrent_balances = concurrent_balances
         self.get_orders_function = None
         self.get_balances_function = None
         self.place_order_function = None
@@ -106,13 +111,16 @@ class OrderBookManager:
         self.on_update_function = None
 
         self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._balances_executor = ThreadPoolExecutor(max_workers=1) if concurrent_balances else None
         self._lock = threading.Lock()
         self._state = None
+        self._state_available = threading.Event()
         self._refresh_count = 0
         self._currently_placing_orders = 0
         self._orders_placed = list()
         self._order_ids_cancelling = set()
         self._order_ids_cancelled = set()
+        self._cancellations_finished = threading.Condition(self._lock)
 
     def get_orders_with(self, get_orders_function):
         """Configures the function used to fetch active keeper orders.
@@ -184,40 +192,55 @@ class OrderBookManager:
         Returns:
             An `OrderBook` class instance.
         """
+        # We get woken up as soon as the first refresh completes, the timeout only makes
+        # us keep logging while waiting.
         while self._state is None:
             self.logger.info("Waiting for the order book to become available...")
-            time.sleep(0.5)
+            self._state_available.wait(timeout=0.5)
 
+        # We only take a snapshot of the state while holding the lock, so background threads
+        # placing and cancelling orders or refreshing the order book do not have to wait for
+        # us to merge and filter the orders.
         with self._lock:
-            self.logger.debug(f"Getting the order book")
-            self.logger.debug(f"Orders retrieved last time: {[order.order_id for order in self._state['orders']]}")
-            self.logger.debug(f"Orders placed since then: {[order.order_id for order in self._orders_placed]}")
-            self.logger.debug(f"Orders cancelled since then: {[order_id for order_id in self._order_ids_cancelled]}")
-            self.logger.debug(f"Orders being cancelled: {[order_id for order_id in self._order_ids_cancelling]}")
-            self.logger.debug(f"Orders being placed: {self._currently_placing_orders} order(s)")
-
-            # TODO: below we remove orders which are being or have been cancelled, and orders
-            # which have been placed, but we to not update the balances accordingly. it will
-            # work correctly as long as the market maker keeper has enough balance available.
-            # when it will get low on balance, order placement may fail or too tiny replacement
-            # orders may get created for a while.
-
-            # Add orders which have been placed.
-            orders = list(self._state['orders'])
-            for order in self._orders_placed:
-                if order.order_id not in list(map(lambda order: order.order_id, orders)):
-                    orders.append(order)
-
-            # Remove orders being cancelled and already cancelled.
-            orders = list(filter(lambda order: order.order_id not in self._order_ids_cancelling and
-                                               order.order_id not in self._order_ids_cancelled, orders))
+            state = self._state
+            orders_placed = list(self._orders_placed)
+            order_ids_cancelled = set(self._order_ids_cancelled)
+            order_ids_cancelling = set(self._order_ids_cancelling)
+            currently_placing_orders = self._currently_placing_orders
 
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"Getting the order book")
+            self.logger.debug(f"Orders retrieved last time: {[order.order_id for order in state['orders']]}")
+            self.logger.debug(f"Orders placed since then: {[order.order_id for order in orders_placed]}")
+            self.logger.debug(f"Orders cancelled since then: {[order_id for order_id in order_ids_cancelled]}")
+            self.logger.debug(f"Orders being cancelled: {[order_id for order_id in order_ids_cancelling]}")
+            self.logger.debug(f"Orders being placed: {currently_placing_orders} order(s)")
+
+        # TODO: below we remove orders which are being or have been cancelled, and orders
+        # which have been placed, but we to not update the balances accordingly. it will
+        # work correctly as long as the market maker keeper has enough balance available.
+        # when it will get low on balance, order placement may fail or too tiny replacement
+        # orders may get created for a while.
+
+        # Add orders which have been placed.
+        orders = list(state['orders'])
+        order_ids = set(order.order_id for order in orders)
+        for order in orders_placed:
+            if order.order_id not in order_ids:
+                orders.append(order)
+                order_ids.add(order.order_id)
+
+        # Remove orders being cancelled and already cancelled.
+        order_ids_to_remove = order_ids_cancelling | order_ids_cancelled
+        orders = [order for order in orders if order.order_id not in order_ids_to_remove]
+
+        if self.logger.isEnabledFor(logging.DEBUG):
             self.logger.debug(f"Returned orders: {[order.order_id for order in orders]}")
 
         return OrderBook(orders=orders,
-                         balances=self._state['balances'],
-                         orders_being_placed=self._currently_placing_orders > 0,
-                         orders_being_cancelled=len(self._order_ids_cancelling) > 0)
+                         balances=state['balances'],
+                         orders_being_placed=currently_placing_orders > 0,
+                         orders_being_cancelled=len(order_ids_cancelling) > 0)
 
     def place_order(self, place_order_function):
         """Places new order. Order placement will happen in a background thread.
@@ -232,7 +255,7 @@ class OrderBookManager:
 
         self._report_order_book_updated()
 
-        self._executor.submit(self._thread_place_order(place_order_function))
+        self._executor.submit(self._thread_place_order, place_order_function)
 
     def place_orders(self, new_orders: list):
         """Places new orders. Order placement will happen in a background thread.
@@ -249,7 +272,7 @@ class OrderBookManager:
         self._report_order_book_updated()
 
         for new_order in new_orders:
-            self._executor.submit(self._thread_place_order(partial(self.place_order_function, new_order)))
+            self._executor.submit(self._thread_place_order, partial(self.place_order_function, new_order))
 
     def cancel_orders(self, orders: list):
         """Cancels existing orders. Order cancellation will happen in a background thread.
@@ -267,7 +290,7 @@ class OrderBookManager:
         self._report_order_book_updated()
 
         for order in orders:
-            self._executor.submit(self._thread_cancel_order(order.order_id, partial(self.cancel_order_function, order)))
+            self._executor.submit(self._thread_cancel_order, order.order_id, partial(self.cancel_order_function, order))
 
     def replace_orders(self, orders: list, new_orders: list):
         """Replaces existing orders with new ones.
@@ -290,10 +313,10 @@ class OrderBookManager:
         self._report_order_book_updated()
 
         for order in orders:
-            self._executor.submit(self._thread_cancel_order(order.order_id, partial(self.cancel_order_function, order)))
+            self._executor.submit(self._thread_cancel_order, order.order_id, partial(self.cancel_order_function, order))
 
         for new_order in new_orders:
-            self._executor.submit(self._thread_place_order(partial(self.place_order_function, new_order)))
+            self._executor.submit(self._thread_place_order, partial(self.place_order_function, new_order))
 
     def cancel_all_orders(self, final_wait_time: int = None):
         # Cancel all orders straight away, repeat until the internal order book state confirms
@@ -307,7 +330,7 @@ class OrderBookManager:
 
             self.logger.info(f"Cancelling {len(orders)} open orders...")
 
-            self.cancel_orders(self.get_order_book().orders)
+            self.cancel_orders(orders)
             self.wait_for_stable_order_book()
 
         # Wait for the background thread to refresh the order book twice, so we are 99.9% sure
@@ -345,8 +368,11 @@ class OrderBookManager:
 
     def wait_for_order_cancellation(self):
         """Wait until no background order cancellation takes place."""
-        while len(self._order_ids_cancelling) > 0:
-            time.sleep(0.1)
+        # Cancellation threads notify us when the last cancellation finishes. The timeout is
+        # only a safety net for subclasses which cancel orders in their own way.
+        with self._lock:
+            while len(self._order_ids_cancelling) > 0:
+                self._cancellations_finished.wait(timeout=0.1)
 
     def wait_for_order_book_refresh(self):
         """Wait until at least one background order book refresh happens since now."""
@@ -382,8 +408,13 @@ class OrderBookManager:
                     orders_already_placed_before = set(self._orders_placed)
 
                 # get orders, get balances
-                orders = self.get_orders_function()
-                balances = self.get_balances_function() if self.get_balances_function is not None else None
+                if self.concurrent_balances and self.get_balances_function is not None:
+                    balances_future = self._balances_executor.submit(self.get_balances_function)
+                    orders = self.get_orders_function()
+                    balances = balances_future.result()
+                else:
+                    orders = self.get_orders_function()
+                    balances = self.get_balances_function() if self.get_balances_function is not None else None
 
                 if self.order_history_reporter:
                     orders_buy = self.buy_filter_function(orders)
@@ -400,55 +431,46 @@ class OrderBookManager:
                         self.logger.info("Order book became available")
 
                     self._state = {'orders': orders, 'balances': balances}
+                    self._state_available.set()
                     self._refresh_count += 1
 
                 self._report_order_book_updated()
 
-                self.logger.debug(f"Fetched the order book"
-                                  f" (orders: {[order.order_id for order in orders]})")
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug(f"Fetched the order book"
+                                      f" (orders: {[order.order_id for order in orders]})")
             except Exception as e:
                 self.logger.info(f"Failed to fetch the order book ({e})")
 
             time.sleep(self.refresh_frequency)
 
     def _thread_place_order(self, place_order_function):
-        assert(callable(place_order_function))
+        try:
+            new_order = place_order_function()
 
-        def func():
-            try:
-                new_order = place_order_function()
-
-                if new_order is not None:
-                    with self._lock:
-                        self._orders_placed.append(new_order)
-            except BaseException as exception:
-                self.logger.exception(exception)
-            finally:
+            if new_order is not None:
                 with self._lock:
-                    self._currently_placing_orders -= 1
-
-                self._report_order_book_updated()
+                    self._orders_placed.append(new_order)
+        except BaseException as exception:
+            self.logger.exception(exception)
+        finally:
+            with self._lock:
+                self._currently_placing_orders -= 1
 
-        return func
+            self._report_order_book_updated()
 
     def _thread_cancel_order(self, order_id, cancel_order_function):
-        assert(callable(cancel_order_function))
-
-        def func():
-            try:
-                if cancel_order_function():
-                    with self._lock:
-                        self._order_ids_cancelled.add(order_id)
-                        self._order_ids_cancelling.remove(order_id)
-            except BaseException as exception:
-                self.logger.exception(f"Failed to cancel {order_id}")
-            finally:
+        try:
+            if cancel_order_function():
                 with self._lock:
-                    try:
-                        self._order_ids_cancelling.remove(order_id)
-                    except KeyError:
-                        pass
+                    self._order_ids_cancelled.add(order_id)
+        except BaseException as exception:
+            self.logger.exception(f"Failed to cancel {order_id}")
+        finally:
+            with self._lock:
+                self._order_ids_cancelling.discard(order_id)
 
-                self._report_order_book_updated()
+                if len(self._order_ids_cancelling) == 0:
+                    self._cancellations_finished.notify_all()
 
-        return func
+            self._report_order_book_updated()
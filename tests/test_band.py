@@ -42,6 +42,40 @@ class FakeOrder:
         return self.amount
 
 
+class FakeBand:
+    def __init__(self, min_margin: float, max_margin: float):
+        self.min_margin = min_margin
+        self.max_margin = max_margin
+
+
+class TestBandsOverlap:
+    def test_should_not_detect_overlap_for_adjacent_bands(self):
+        # given
+        bands = [FakeBand(0.04, 0.06), FakeBand(0.01, 0.02), FakeBand(0.02, 0.04)]
+
+        # expect
+        assert(Bands._bands_overlap(bands) is False)
+
+    def test_should_detect_overlap_for_partially_overlapping_bands(self):
+        # given
+        bands = [FakeBand(0.04, 0.06), FakeBand(0.01, 0.02), FakeBand(0.02, 0.05)]
+
+        # expect
+        assert(Bands._bands_overlap(bands) is True)
+
+    def test_should_detect_overlap_for_band_enclosing_other_bands(self):
+        # given
+        bands = [FakeBand(0.02, 0.03), FakeBand(0.04, 0.05), FakeBand(0.01, 0.10)]
+
+        # expect
+        assert(Bands._bands_overlap(bands) is True)
+
+    def test_should_not_detect_overlap_for_no_bands_or_a_single_band(self):
+        # expect
+        assert(Bands._bands_overlap([]) is False)
+        assert(Bands._bands_overlap([FakeBand(0.01, 0.02)]) is False)
+
+
 class TestBands:
     def test_should_not_create_orders_if_neither_buy_nor_sell_price_available(self, tmpdir):
         # given
@@ -103,6 +137,20 @@ class TestBands:
         assert(new_orders[1].price == Wad.from_number(208))
         assert(new_orders[1].amount == Wad.from_number(7.5))
 
+    def test_should_report_missing_amounts_if_there_is_no_balance(self, tmpdir):
+        # given
+        config = BandConfig.sample_config(tmpdir)
+        bands = self.create_bands(config)
+
+        # when
+        price = Price(buy_price=Wad.from_number(100), sell_price=Wad.from_number(200))
+        new_orders, missing_buy_amount, missing_sell_amount = bands.new_orders([], [], Wad(0), Wad(0), price)
+
+        # then
+        assert(new_orders == [])
+        assert(missing_buy_amount == Wad.from_number(75))
+        assert(missing_sell_amount == Wad.from_number(7.5))
+
     def test_should_not_cancel_anything_if_no_orders_to_cancel_regardless_of_price_availability(self, tmpdir):
         # given
         config = BandConfig.sample_config(tmpdir)
@@ -165,6 +213,54 @@ class TestBands:
         # then
         assert(orders_to_cancel == [buy_order, sell_order])
 
+    def test_should_use_limits_with_the_amount_of_each_confirmed_order(self, tmpdir):
+        # given
+        config = BandConfig.two_adjacent_bands_config(tmpdir)
+        history = History()
+        bands = Bands.read(ReloadableConfig(str(config)), EmptyFeed(), FixedFeed({'canBuy': True, 'canSell': True}), history)
+
+        # and
+        price = Price(buy_price=None, sell_price=Wad.from_number(200))
+        new_orders, _, _ = bands.new_orders([], [], Wad.from_number(1000000), Wad.from_number(1000000), price)
+
+        # when
+        for new_order in new_orders:
+            new_order.confirm()
+
+        # then
+        assert(len(new_orders) == 2)
+        assert(list(map(lambda item: item['amount'], history.sell_history.get_items())) == [Wad.from_number(7.5), Wad.from_number(9.5)])
+
+    def test_should_use_history_of_each_side_if_config_is_invalid(self, tmpdir):
+        # given
+        config = tmpdir.join("invalid_config.json")
+        config.write("""{}""")
+        history = History()
+
+        # when
+        bands = Bands.read(ReloadableConfig(str(config)), EmptyFeed(), FixedFeed({'canBuy': True, 'canSell': True}), history)
+
+        # then
+        assert(bands.buy_bands == [])
+        assert(bands.sell_bands == [])
+        assert(bands.buy_limits.side_history is history.buy_history)
+        assert(bands.sell_limits.side_history is history.sell_history)
+
+    def test_should_reuse_bands_only_if_config_has_not_changed(self, tmpdir):
+        # given
+        config = BandConfig.sample_config(tmpdir)
+        bands = self.create_bands(config)
+
+        # expect
+        assert(self.create_bands(config).sell_bands[0] is bands.sell_bands[0])
+
+        # when
+        config = BandConfig.sample_config_dif_margins(tmpdir)
+
+        # then
+        assert(self.create_bands(config).sell_bands[0] is not bands.sell_bands[0])
+        assert(self.create_bands(config).sell_bands[0].min_margin == 0.03)
+
     @staticmethod
     def create_bands(config_file):
         config = ReloadableConfig(str(config_file))
@@ -0,0 +1,69 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+
+from market_maker_keeper.order_book import OrderBookManager
+
+
+class FakeOrder:
+    def __init__(self, order_id: int):
+        self.order_id = order_id
+
+
+class TestOrderBookManager:
+    def test_should_fetch_balances_after_orders_by_default(self):
+        # given
+        calls = []
+        order_book_manager = OrderBookManager(refresh_frequency=1)
+        order_book_manager.get_orders_with(lambda: calls.append('orders') or [FakeOrder(1)])
+        order_book_manager.get_balances_with(lambda: calls.append('balances') or {'ETH': 10})
+
+        # when
+        order_book_manager.start()
+        order_book = order_book_manager.get_order_book()
+
+        # then
+        assert(calls[:2] == ['orders', 'balances'])
+        assert([order.order_id for order in order_book.orders] == [1])
+        assert(order_book.balances == {'ETH': 10})
+
+    def test_should_publish_orders_and_balances_together_if_fetched_concurrently(self):
+        # given
+        balances_started = threading.Event()
+        overlaps = []
+
+        def get_orders():
+            overlaps.append(balances_started.wait(timeout=5))
+            return [FakeOrder(1), FakeOrder(2)]
+
+        def get_balances():
+            balances_started.set()
+            return {'ETH': 10}
+
+        order_book_manager = OrderBookManager(refresh_frequency=1, concurrent_balances=True)
+        order_book_manager.get_orders_with(get_orders)
+        order_book_manager.get_balances_with(get_balances)
+
+        # when
+        order_book_manager.start()
+        order_book = order_book_manager.get_order_book()
+
+        # then
+        assert(overlaps[0] is True)
+        assert([order.order_id for order in order_book.orders] == [1, 2])
+        assert(order_book.balances == {'ETH': 10})